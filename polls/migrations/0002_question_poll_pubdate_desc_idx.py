@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-15 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-pub_date'], name='poll_pubdate_desc_idx'),
+        ),
+    ]
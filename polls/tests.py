@@ -1,12 +1,25 @@
+"""
+Tests of the polls application.
+
+The database-backed test classes rely on django.test.TestCase: the data created in
+setUpTestData is inserted once per class inside a class-level transaction, and every
+test is rolled back to it with a savepoint. Do not convert them to TransactionTestCase
+without benchmarking; that flushes the tables and re-creates the data for every test.
+"""
 import datetime
-from django.test import TestCase
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
 from django.utils import timezone
 from django.urls import reverse
 
 from .models import Question, Choice
 
+# the cheapest password hasher, for whenever a test creates or logs in a user
+fast_password_hashing = override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
 
-class QuestionModelTests(TestCase):
+
+class QuestionModelTests(SimpleTestCase):
 
     def test_was_published_recently_with_future_question(self):
         """
@@ -52,13 +65,49 @@ def create_question(question_text, days):
     return Question.objects.create(question_text=question_text, pub_date=time)
 
 
+def bulk_create_with_ids(model, objs):
+    """
+    Insert 'objs' with a single INSERT when the database backend returns the ids of bulk inserted
+    rows (i.e. PostgreSQL). Otherwise (i.e. SQLite) save them one by one, so that the returned
+    objects always have their id set
+    :param model: model class of the objects
+    :param objs: list of unsaved instances of 'model'
+    :return: list of the saved objects, in the given order
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        return model.objects.bulk_create(objs)
+    for obj in objs:
+        obj.save()
+    return objs
+
+
+def create_questions(specs):
+    """
+    Create several questions, with a single INSERT where the database backend allows it.
+    Each spec is a ('question_text', days) pair with the same meaning as the arguments of create_question
+    :param specs: iterable of (question_text, days) pairs
+    :return: list of the created questions with their ids set, in the order of specs
+    """
+    now = timezone.now()
+    return bulk_create_with_ids(
+        Question,
+        [Question(question_text=question_text, pub_date=now + datetime.timedelta(days=days))
+         for question_text, days in specs]
+    )
+
+
+@fast_password_hashing
 class QuestionIndexViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.index_url = reverse('polls:index')
+
     def test_no_questions(self):
         """
         If no questions exist, an appropriate message is displayed
         :return: None
         """
-        response = self.client.get(reverse('polls:index'))
+        response = self.client.get(self.index_url)
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'No polls are available.')
         self.assertQuerysetEqual(response.context['latest_question_list'], [])
@@ -69,12 +118,12 @@ class QuestionIndexViewTests(TestCase):
         :return: None
         """
         past_question = create_question(question_text='Past Question', days=-30)
-        choice = Choice(question=past_question, choice_text='A choice', votes=0)
-        choice.save()
-        response = self.client.get(reverse('polls:index'))
+        Choice.objects.create(question=past_question, choice_text='A choice', votes=0)
+        response = self.client.get(self.index_url)
         self.assertQuerysetEqual(
             response.context['latest_question_list'],
-            ['<Question: Past Question>']
+            [past_question],
+            transform=lambda question: question
         )
 
     def test_future_question_with_a_choice(self):
@@ -83,10 +132,9 @@ class QuestionIndexViewTests(TestCase):
         the index page. This is because pub_date is in the future
         """
         future_question = create_question(question_text="Future question.", days=30)
-        choice = Choice(question=future_question, choice_text='A choice', votes=0)
-        choice.save()
+        Choice.objects.create(question=future_question, choice_text='A choice', votes=0)
 
-        response = self.client.get(reverse('polls:index'))
+        response = self.client.get(self.index_url)
         self.assertContains(response, "No polls are available.")
         self.assertQuerysetEqual(response.context['latest_question_list'], [])
 
@@ -95,18 +143,17 @@ class QuestionIndexViewTests(TestCase):
         Even if both past and future questions exist, only past questions
         are displayed. Note that all questions have at least one choice
         """
-        past_question = create_question(question_text="Past question.", days=-30)
-        choice = Choice(question=past_question, choice_text='A choice', votes=0)
-        choice.save()
+        past_question, future_question = create_questions([("Past question.", -30), ("Future question.", 30)])
+        Choice.objects.bulk_create([
+            Choice(question=past_question, choice_text='A choice', votes=0),
+            Choice(question=future_question, choice_text='A choice', votes=0),
+        ])
 
-        future_question = create_question(question_text="Future question.", days=30)
-        choice = Choice(question=future_question, choice_text='A choice', votes=0)
-        choice.save()
-
-        response = self.client.get(reverse('polls:index'))
+        response = self.client.get(self.index_url)
         self.assertQuerysetEqual(
             response.context['latest_question_list'],
-            ['<Question: Past question.>']
+            [past_question],
+            transform=lambda question: question
         )
 
     def test_two_past_questions_both_with_a_choice(self):
@@ -114,18 +161,17 @@ class QuestionIndexViewTests(TestCase):
         The questions index page may display multiple questions if they are both in the past
         and they both have at least one choice.
         """
-        past_question_1 = create_question(question_text="Past question 1.", days=-30)
-        choice = Choice(question=past_question_1, choice_text='A choice', votes=0)
-        choice.save()
-
-        past_question_2 = create_question(question_text="Past question 2.", days=-5)
-        choice = Choice(question=past_question_2, choice_text='A choice', votes=0)
-        choice.save()
+        past_question_1, past_question_2 = create_questions([("Past question 1.", -30), ("Past question 2.", -5)])
+        Choice.objects.bulk_create([
+            Choice(question=past_question_1, choice_text='A choice', votes=0),
+            Choice(question=past_question_2, choice_text='A choice', votes=0),
+        ])
 
-        response = self.client.get(reverse('polls:index'))
+        response = self.client.get(self.index_url)
         self.assertQuerysetEqual(
             response.context['latest_question_list'],
-            ['<Question: Past question 2.>', '<Question: Past question 1.>']
+            [past_question_2, past_question_1],
+            transform=lambda question: question
         )
 
     def test_two_past_questions_both_without_a_choice(self):
@@ -133,10 +179,9 @@ class QuestionIndexViewTests(TestCase):
         The questions index page displays an appropriate message, if
         there are more than two past questions either without any choice
         """
-        past_question_1 = create_question(question_text="Past question 1.", days=-30)
-        past_question_2 = create_question(question_text="Past question 2.", days=-5)
+        create_questions([("Past question 1.", -30), ("Past question 2.", -5)])
 
-        response = self.client.get(reverse('polls:index'))
+        response = self.client.get(self.index_url)
         self.assertQuerysetEqual(
             response.context['latest_question_list'],
             []
@@ -145,15 +190,33 @@ class QuestionIndexViewTests(TestCase):
         self.assertContains(response, 'No polls are available.')
 
 
+@fast_password_hashing
 class QuestionDetailViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        """
+        The detail view looks a question up by its id, so the questions of all the tests
+        can live in the database together. They are created once for the whole class
+        """
+        cls.future_question, cls.past_question_with_no_choices, cls.past_question_with_choices = create_questions([
+            ('Future question.', 5),
+            ('Past Question with no choices.', -5),
+            ('Past Question with 2 choices.', -5),
+        ])
+        Choice.objects.bulk_create([
+            Choice(question=cls.past_question_with_choices, choice_text='Choice 1', votes=0),
+            Choice(question=cls.past_question_with_choices, choice_text='Choice 2', votes=0),
+        ])
+        cls.future_question_url = reverse('polls:detail', args=(cls.future_question.id,))
+        cls.past_question_with_no_choices_url = reverse('polls:detail', args=(cls.past_question_with_no_choices.id,))
+        cls.past_question_with_choices_url = reverse('polls:detail', args=(cls.past_question_with_choices.id,))
+
     def test_future_question(self):
         """
         The detail view of a question with a pub_date in the future
         returns a 404 not found.
         """
-        future_question = create_question(question_text='Future question.', days=5)
-        url = reverse('polls:detail', args=(future_question.id,))
-        response = self.client.get(url)
+        response = self.client.get(self.future_question_url)
         self.assertEqual(response.status_code, 404)
 
     def test_past_question_with_no_choices(self):
@@ -161,9 +224,7 @@ class QuestionDetailViewTests(TestCase):
         The detail view of a question with a pub_date in the past and without any choices
         returns a 404 not found
         """
-        past_question = create_question(question_text='Past Question with no choices.', days=-5)
-        url = reverse('polls:detail', args=(past_question.id,))
-        response = self.client.get(url)
+        response = self.client.get(self.past_question_with_no_choices_url)
         self.assertEqual(response.status_code, 404)
 
     def test_past_question_with_choices(self):
@@ -171,29 +232,38 @@ class QuestionDetailViewTests(TestCase):
         The detail view of a question with a pub_date in the past and with choices returns
         the question.question_text in the response body
         """
-        past_question_with_choices = create_question(question_text='Past Question with 2 choices.', days=-5)
-        choice1 = Choice(question=past_question_with_choices, choice_text='Choice 1', votes=0)
-        choice1.save()
-        choice2 = Choice(question=past_question_with_choices, choice_text='Choice 2', votes=0)
-        choice2.save()
-        url = reverse('polls:detail', args=(past_question_with_choices.id,))
-        response = self.client.get(url)
+        response = self.client.get(self.past_question_with_choices_url)
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'Past Question with 2 choices.')
 
 
+@fast_password_hashing
 class QuestionResultsViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        """
+        The results view looks a question up by its id, so the questions of all the tests
+        can live in the database together. They are created once for the whole class
+        """
+        cls.future_question, cls.past_question, cls.past_question_without_a_choice = create_questions([
+            ('Future question.', 5),
+            ('Past Question.', -5),
+            ('Past Question without a choice.', -5),
+        ])
+        Choice.objects.bulk_create([
+            Choice(question=cls.future_question, choice_text='Choice', votes=0),
+            Choice(question=cls.past_question, choice_text='Choice', votes=0),
+        ])
+        cls.future_question_url = reverse('polls:results', args=(cls.future_question.id,))
+        cls.past_question_url = reverse('polls:results', args=(cls.past_question.id,))
+        cls.past_question_without_a_choice_url = reverse('polls:results', args=(cls.past_question_without_a_choice.id,))
+
     def test_future_question_with_a_choice(self):
         """
         The result view of a question with a pub_date in the future and with a choice
         returns a 404 not found.
         """
-        future_question = create_question(question_text='Future question.', days=5)
-        choice = Choice(question=future_question, choice_text='Choice', votes=0)
-        choice.save()
-
-        url = reverse('polls:results', args=(future_question.id,))
-        response = self.client.get(url)
+        response = self.client.get(self.future_question_url)
         self.assertEqual(response.status_code, 404)
 
     def test_past_question_with_a_choice(self):
@@ -201,62 +271,59 @@ class QuestionResultsViewTests(TestCase):
         The results view of a question with a pub_date in the past and with a choice
         displays the question's text and gets 200 status code
         """
-        past_question = create_question(question_text='Past Question.', days=-5)
-        choice = Choice(question=past_question, choice_text='Choice', votes=0)
-        choice.save()
-
-        url = reverse('polls:results', args=(past_question.id,))
-        response = self.client.get(url)
+        response = self.client.get(self.past_question_url)
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, past_question.question_text)
+        self.assertContains(response, self.past_question.question_text)
 
     def test_future_and_past_question_both_with_a_choice(self):
         """
         The results view of two questions: Future question with a pub_date in the future
         and past question with a pub_date in the past. Both questions have a Choice.
         The view returns 200; in the response content there is past question's text
+        and there is not the future question's text
         """
-        future_question = create_question(question_text='Future question.', days=5)
-        choice = Choice(question=future_question, choice_text='Choice', votes=0)
-        choice.save()
-
-        past_question = create_question(question_text='Past Question.', days=-5)
-        choice = Choice(question=past_question, choice_text='Choice', votes=0)
-        choice.save()
-
-        url = reverse('polls:results', args=(past_question.id,))
-        response = self.client.get(url)
+        response = self.client.get(self.past_question_url)
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, past_question.question_text)
+        self.assertContains(response, self.past_question.question_text)
+        self.assertNotContains(response, self.future_question.question_text)
 
     def test_past_question_without_a_choice(self):
         """
         The results view of a question with a pub_date in the past and WITHOUT a choice
         gets 404 status code.
         """
-        past_question = create_question(question_text='Past Question.', days=-5)
-        url = reverse('polls:results', args=(past_question.id,))
-        response = self.client.get(url)
+        response = self.client.get(self.past_question_without_a_choice_url)
         self.assertEqual(response.status_code, 404)
 
 
 def create_question_with_choices(question_text, days):
     question = create_question(question_text=question_text, days=days)
-    choice_1 = Choice(question=question, choice_text='Choice 1', votes=0)
-    choice_1.save()
-    choice_2 = Choice(question=question, choice_text='Choice 2', votes=0)
-    choice_2.save()
-    choice_3 = Choice(question=question, choice_text='Choice 3', votes=0)
-    choice_3.save()
-    return question, choice_2.id
+    choices = bulk_create_with_ids(
+        Choice, [Choice(question=question, choice_text='Choice {}'.format(i), votes=0) for i in (1, 2, 3)]
+    )
+    return question, choices[1].id
 
 
+@fast_password_hashing
 class QuestionVoteViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        """
+        A future and a past question, each with choices, shared by all the tests.
+        Votes cast by a test are rolled back at the end of that test
+        """
+        cls.future_question_with_choices, cls.future_choice_id = create_question_with_choices(
+            question_text='Future question', days=30)
+        cls.past_question_with_choices, cls.past_choice_id = create_question_with_choices(
+            question_text='Past question', days=-30)
+        cls.future_question_url = reverse('polls:vote', args=(cls.future_question_with_choices.id,))
+        cls.past_question_url = reverse('polls:vote', args=(cls.past_question_with_choices.id,))
+
     def test_question_id_not_found(self):
         """
         To test, when an invalid question id is passed as question_id to the view, the view returns 404
         """
-        # empty database
+        # no question with this id exists among the ones created in setUpTestData
         invalid_question_id = 10000
         url = reverse('polls:vote', args=(invalid_question_id,))
         response = self.client.post(url, {'choice': 10})
@@ -267,9 +334,7 @@ class QuestionVoteViewTests(TestCase):
         When a future question's id is passed to the view, the view returns 404.
         Note that future question has choices
         """
-        future_question_with_choices, choice_id = create_question_with_choices(question_text='Future question', days=30)
-        url = reverse('polls:vote', args=(future_question_with_choices.id,))
-        response = self.client.post(url, {'choice': choice_id})
+        response = self.client.post(self.future_question_url, {'choice': self.future_choice_id})
         self.assertEqual(response.status_code, 404)
 
     def test_voting_with_no_choice_provided(self):
@@ -278,9 +343,26 @@ class QuestionVoteViewTests(TestCase):
         we do NOT provide a choice_id in the request body (i.e. there is no choice=10 in the request body).
         We expect that view returns 400 status code.
         """
-        past_question_with_choices, choice_id = create_question_with_choices(question_text='Past question', days=-30)
-        url = reverse('polls:vote', args=(past_question_with_choices.id,))
-        response = self.client.post(url)  # note that we do not provide {'choice':choice_id} in the POST request
+        response = self.client.post(self.past_question_url)  # note that we do not provide {'choice':choice_id} in the POST request
+        self.assertEqual(response.status_code, 400)
+
+    def test_voting_with_non_integer_choice(self):
+        """
+        A past question has choices. When a POST request is made to the view with the URL (i.e. /polls/5/vote/)
+        and the choice in the request body is not an integer (i.e. choice=abc), the view returns 400 status code
+        """
+        response = self.client.post(self.past_question_url, {'choice': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_voting_with_no_choice_provided_for_non_existing_question(self):
+        """
+        When a POST request without a choice_id in the request body is made for a question id that
+        does not exist, the view returns 400 status code; the request body is rejected before
+        the question is looked up
+        """
+        invalid_question_id = 10000
+        url = reverse('polls:vote', args=(invalid_question_id,))
+        response = self.client.post(url)
         self.assertEqual(response.status_code, 400)
 
     def test_voting_with_non_existing_choice_id(self):
@@ -290,28 +372,37 @@ class QuestionVoteViewTests(TestCase):
         We expect that view returns 200 status code. Note that in the response body should exist the request URL
         and there has to be 'Vote' button in the response body
         """
-        past_question_with_choices, choice_id = create_question_with_choices(question_text='Past question', days=-30)
-        url = reverse('polls:vote', args=(past_question_with_choices.id,))
-        response = self.client.post(url, {'choice': 10000})  # note that there is no Choice with an id 10000
+        response = self.client.post(self.past_question_url, {'choice': 10000})  # there is no Choice with id 10000
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, url)
+        self.assertContains(response, self.past_question_url)
         self.assertContains(response, 'Vote')
 
+    def test_voting_with_choice_id_of_another_question(self):
+        """
+        A POST request is made to a past question's vote URL (i.e. /polls/5/vote/) with the id of a choice
+        belonging to another question. We expect the view to redisplay the voting form with 200 status code
+        and the other question's choice to keep 0 votes
+        """
+        response = self.client.post(self.past_question_url, {'choice': self.future_choice_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['error_message'], "You didn't select a choice with a valid id")
+        self.assertEqual(Choice.objects.get(pk=self.future_choice_id).votes, 0)
+
     def test_past_question_with_choices(self):
         """
         A past question has choices. We select a choice with choice_id to be voted for.
         When a POST request is made to the view with URL (i.e. /polls/5/vote), we also pass the choice_id
         in the request body (i.e. choice=10). We expect the view to answer us with 302 (Redirect) with a
         URL (i.e. /polls/5/results). We make a new GET request with the provided url and check that
-        the status code is 200 and the response contains question_text in its body
+        the status code is 200 and the response contains question_text in its body.
+        The voted choice's vote count goes from 0 to 1
         """
-        past_question_with_choices, choice_id = create_question_with_choices(question_text='Past question', days=-30)
-        url = reverse('polls:vote', args=(past_question_with_choices.id,))
-        response = self.client.post(url, {'choice': choice_id})
+        response = self.client.post(self.past_question_url, {'choice': self.past_choice_id})
         self.assertEqual(response.status_code, 302)
+        self.assertEqual(Choice.objects.get(pk=self.past_choice_id).votes, 1)
 
         response = self.client.get(response.url)
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, past_question_with_choices.question_text)
+        self.assertContains(response, self.past_question_with_choices.question_text)
 
 
@@ -1,19 +1,23 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.views import generic
-from django.utils import timezone
-from django.http import Http404, HttpResponseBadRequest
+from django.http import HttpResponseBadRequest
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Now
 
 from .models import Choice, Question
 
 
-# def index(request):
-#     latest_question_list = Question.objects.order_by('-pub_date')[:5]
-#     context = {
-#         'latest_question_list': latest_question_list
-#     }
-#     return render(request, 'polls/index.html', context)
+def _published_with_choices():
+    """ Return the questions which are already published and have at least one choice """
+    # Exists() is annotated rather than passed to filter() directly, since
+    # Django 2.2 only accepts boolean expressions through an annotation
+    return (Question.objects
+            .filter(pub_date__lte=Now())
+            .annotate(has_choices=Exists(Choice.objects.filter(question=OuterRef('pk'))))
+            .filter(has_choices=True))
+
 
 class IndexView(generic.ListView):
     template_name = 'polls/index.html'
@@ -22,15 +26,7 @@ class IndexView(generic.ListView):
     def get_queryset(self):
         """ Return the last five published questions (not including those set to be
         published in the future"""
-        query_set = Question.objects.filter(pub_date__lte=timezone.now())
-        for q in query_set:
-            if not q.choice_set.all():  # if the question does not have any choices
-                query_set = query_set.exclude(pk=q.id)
-        return query_set.order_by('-pub_date')[:5]
-
-# def detail(request, question_id):
-#     question = get_object_or_404(Question, pk=question_id)
-#     return render(request, 'polls/detail.html', {'question': question})
+        return _published_with_choices().only('id', 'question_text', 'pub_date').order_by('-pub_date')[:5]
 
 
 class DetailView(generic.DetailView):
@@ -40,17 +36,10 @@ class DetailView(generic.DetailView):
 
     def get_queryset(self):
         """
-        Excludes any questions that are not published yet
+        Excludes any questions that are not published yet or have no choices
         """
-        query_set = Question.objects.filter(pub_date__lte=timezone.now())
-        for q in query_set:
-            if not q.choice_set.all():  # if there are no choices in the question
-                query_set = query_set.exclude(pk=q.id)
-        return query_set
-
-# def results(request, question_id):
-#     question = get_object_or_404(Question, pk=question_id)
-#     return render(request, 'polls/results.html', {'question': question})
+        # the template lists the question's choices; fetch them with one extra query
+        return _published_with_choices().only('id', 'question_text').prefetch_related('choice_set')
 
 
 class ResultsView(generic.DetailView):
@@ -60,40 +49,35 @@ class ResultsView(generic.DetailView):
 
     def get_queryset(self):
         """
-        Excludes any questions that are not published yet
+        Excludes any questions that are not published yet or have no choices
         """
-        query_set = Question.objects.filter(pub_date__lte=timezone.now())
-        for q in query_set:
-            if not q.choice_set.all():  # if there are no choices in the question
-                query_set = query_set.exclude(pk=q.id)
-        return query_set
+        # the template lists the question's choices; fetch them with one extra query
+        return _published_with_choices().only('id', 'question_text').prefetch_related('choice_set')
 
 
 def vote(request, question_id):
-    question = get_object_or_404(Question, pk=question_id)
-    if timezone.now() < question.pub_date:  # the question is published in the future, you can't vote on it
-        raise Http404('Poll will be published in the future; it cant be voted now')
-
-    # at this point, we got a past question
-    if 'choice' in request.POST and request.POST['choice'].isdigit():
-        try:
-            choice_id = int(request.POST['choice'])
-            selected_choice = question.choice_set.get(pk=choice_id)
-        except (KeyError, Choice.DoesNotExist):
-            # Redisplay the question voting form
-            return render(request, 'polls/detail.html', {
-                'question': question,
-                'error_message': "You didn't select a choice with a valid id",
-            })  # returns 200
-        else:
-            selected_choice.votes += 1
-            selected_choice.save()  # TODO: if many users attempt this at the same time, there is a race condition
-            # Always return an HttpResponseRedirect after successfully dealing
-            # with POST data. This prevents data from being posted twice if a
-            # user hits the Back button
-            # This returns 302 - Found redirect message back to client
-            return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
-    else:  # post request body does not have a choice id or the provided 'choice' value contains non-digit chars
+    # post request body does not have a choice id or the provided 'choice' value is not an integer;
+    # reject it before touching the database. int() tolerates surrounding whitespace, a sign and
+    # digit-separating underscores (' 1 ' is 1, '1_0' is 10); such ids are looked up like any other
+    try:
+        choice_id = int(request.POST.get('choice'))
+    except (TypeError, ValueError):
         return HttpResponseBadRequest()  # return 400 status code
 
+    # a question published in the future can't be voted on, so it is a 404 like a missing one
+    question = get_object_or_404(Question.objects.filter(pub_date__lte=Now()), pk=question_id)
 
+    # at this point, we got a past question
+    # a single atomic UPDATE; no read-modify-write race between concurrent voters
+    updated = Choice.objects.filter(pk=choice_id, question=question).update(votes=F('votes') + 1)
+    if updated == 0:
+        # Redisplay the question voting form
+        return render(request, 'polls/detail.html', {
+            'question': question,
+            'error_message': "You didn't select a choice with a valid id",
+        })  # returns 200
+    # Always return an HttpResponseRedirect after successfully dealing
+    # with POST data. This prevents data from being posted twice if a
+    # user hits the Back button
+    # This returns 302 - Found redirect message back to client
+    return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))